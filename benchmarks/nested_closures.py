@@ -0,0 +1,39 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import Program
+from parser import parser
+
+closures = {
+    'no args': 'closure = () {\ni + j\n}\nclosure()',
+    '4 args': 'closure = (a, b, c, d) {\na + b + c + d\n}\nclosure(i, j, i, j)',
+}
+
+def nested_closures(depth, width, closure):
+    # Creates and calls width * width closures from inside `depth` nested functions
+    items = ', '.join(str(i) for i in range(width))
+    text = f'items.$each((i) {{\nitems.$each((j) {{\n{closure}\n}})\n}})'
+    for level in range(depth):
+        text = f'f{level} = () {{\n{text}\n}}\nf{level}()'
+    return f'items = [{items}]\n{text}'
+
+def bench(depth, width, closure, repeat=5):
+    ast = parser.parse(nested_closures(depth, width, closure))
+    best = None
+    for _ in range(repeat):
+        program = Program()
+        start = time.perf_counter()
+        program.stmt(ast)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(20000)
+    width = 40
+    for name, closure in closures.items():
+        for depth in (1, 10, 100, 400):
+            print(f'{name:>7}, depth {depth:>3}: {bench(depth, width, closure) * 1e6 / width ** 2:8.2f} us per closure')
@@ -0,0 +1,104 @@
+from main import Program, read_source
+import asyncio
+import os
+import sys
+import threading
+import time
+
+class ProgramTask:
+    # The evaluator is recursive python, so a program cannot return to the event
+    # loop halfway through an expression. Each program instead evaluates on its
+    # own OS thread, but only while the event loop hands it control: step()
+    # blocks the loop thread until the program suspends, so at most one Lim
+    # program runs at a time and the loop interleaves them. The threads are
+    # never concurrent, they only hold each program's python stack.
+    def __init__(self, program, text, time_slice):
+        self.program = program
+        self.text = text
+        self.time_slice = time_slice
+        self.resume = threading.Semaphore(0)
+        self.paused = threading.Semaphore(0)
+        self.request = None
+        self.reply = None
+        self.slice_start = 0
+
+    def main(self):
+        self.resume.acquire()
+        self.slice_start = time.monotonic()
+        try:
+            self.request = ('return', self.program.run(self.text))
+        except BaseException as e:
+            self.request = ('raise', e)
+        self.paused.release()
+
+    def suspend(self, request):
+        self.request = request
+        self.paused.release()
+        self.resume.acquire()
+        self.slice_start = time.monotonic()
+        value, error = self.reply
+        if error is not None:
+            raise error
+        return value
+
+    def wait(self, awaitable):
+        return self.suspend(('await', awaitable))
+
+    def checkpoint(self):
+        if time.monotonic() - self.slice_start > self.time_slice:
+            self.suspend(('yield', None))
+
+    def step(self, reply):
+        self.reply = reply
+        self.resume.release()
+        self.paused.acquire()
+        return self.request
+
+    async def run(self):
+        self.program.task = self
+        threading.Thread(target=self.main, daemon=True).start()
+        reply = (None, None)
+        try:
+            while True:
+                kind, payload = self.step(reply)
+                if kind == 'return':
+                    return payload
+                elif kind == 'raise':
+                    raise payload
+                try:
+                    if kind == 'yield':
+                        reply = (await asyncio.sleep(0), None)
+                    else:
+                        reply = (await payload, None)
+                except asyncio.CancelledError as e:
+                    # Unwind the suspended program before propagating
+                    self.step((None, e))
+                    raise
+                except Exception as e:
+                    reply = (None, e)
+        finally:
+            self.program.task = None
+
+class Host:
+    def __init__(self, time_slice=0.01):
+        self.time_slice = time_slice
+
+    def spawn(self, text, program=None, time_slice=None):
+        if time_slice is None:
+            time_slice = self.time_slice
+        return ProgramTask(program or Program(), text, time_slice)
+
+    async def run(self, *texts):
+        return await asyncio.gather(*[self.spawn(text).run() for text in texts])
+
+def spawn_file(host, path):
+    program = Program()
+    program.directory = os.path.dirname(path)
+    return host.spawn(read_source(path), program)
+
+async def run_files(*paths):
+    host = Host()
+    return await asyncio.gather(*[spawn_file(host, path).run() for path in paths])
+
+if __name__ == '__main__':
+    asyncio.run(run_files(*sys.argv[1:]))
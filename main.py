@@ -1,5 +1,10 @@
 from parser import parser
-import sys
+from stats import Stats
+import argparse
+import asyncio
+import atexit
+import inspect
+import os
 
 class LimObj:
     def __init__(self, lim_class):
@@ -18,9 +23,10 @@ class LimObj:
         return self.value == rhs
 
 class LimClass(LimObj):
-    def __init__(self, name, parent_class, *args, prototype=None):
+    def __init__(self, name, parent_class, *args, stats, prototype=None):
         super().__init__(*args)
         self.name = name
+        self.stats = stats
         self.parent_class = parent_class
         self.prototype = prototype or self.parent_class.prototype if self.parent_class else {}
 
@@ -37,6 +43,8 @@ class LimClass(LimObj):
         else:
             obj.fields = self.prototype
 
+        if self.stats.enabled:
+            self.stats.instanciated(self, obj)
         return obj
 
 def call_function(func, *args):
@@ -70,13 +78,37 @@ class LimCode(Code):
         self.args = args
 
     def __call__(self, *args, **kwargs):
-        old_function_scopes = self.program.scope.function_scopes
-        self.program.scope.function_scopes = [*self.scopes]
-        self.program.scope.function_scopes.append({arg_name: arg_value for arg_name, arg_value in zip(self.args, args)})
+        if self.program.stats.enabled:
+            self.program.stats.count('frame')
+        scope = self.program.scope
+        old_frame = scope.frame
+        scope.frame = Frame(dict(zip(self.args, args)), self.frame)
         value = self.program.stmt(self.ast)
-        self.program.scope.function_scopes = old_function_scopes
+        scope.frame = old_frame
         return value
 
+class Frame:
+    def __init__(self, variables, parent=None):
+        self.variables = variables
+        self.parent = parent
+
+    def find(self, name):
+        # Inner functions shadow outer functions, file variables are looked up before any frame
+        frame = self
+        while frame is not None:
+            if name in frame.variables:
+                return frame.variables
+            frame = frame.parent
+        return None
+
+def read_file(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+def read_source(path):
+    text = read_file(path)
+    return '\n'.join(clean_line for line in text.split("\n") if (clean_line := line.strip()))
+
 binops = {
     '+': '$add',
     '-': '$sub',
@@ -89,27 +121,28 @@ class Scope:
         self.program = program
         self.builtins = {}
         self.file_scope = {}
-        self.function_scopes = []
+        self.frame = None
         self.init_builtins()
 
     def init_builtins(self):
         self.builtins = {}
-        lim_type = LimClass("Type", None, None)
+        stats = self.program.stats
+        lim_type = LimClass("Type", None, None, stats=stats)
         lim_type.lim_class = lim_type
         lim_type.parent_class = lim_type
         self.builtins["Type"] = lim_type
 
-        self.builtins["Struct"] = LimClass("Struct", lim_type, lim_type)
-        self.builtins["Null"] = LimClass("Null", lim_type, lim_type)
-        self.builtins["Bool"] = LimClass("Bool", lim_type, lim_type)
-        self.builtins["Function"] = LimClass("Function", lim_type, lim_type)
-        self.builtins["Method"] = LimClass("Method", self.builtins["Function"], lim_type)
-        self.builtins["Number"] = LimClass("Number", lim_type, lim_type)
-        self.builtins["Integer"] = LimClass("Integer", self.builtins["Number"], lim_type)
-        self.builtins["Float"] = LimClass("Float", self.builtins["Number"], lim_type)
-        self.builtins["String"] = LimClass("String", lim_type, lim_type)
-        self.builtins["Array"] = LimClass("Array", lim_type, lim_type)
-        self.builtins["Dictionary"] = LimClass("Dictionary", lim_type, lim_type)
+        self.builtins["Struct"] = LimClass("Struct", lim_type, lim_type, stats=stats)
+        self.builtins["Null"] = LimClass("Null", lim_type, lim_type, stats=stats)
+        self.builtins["Bool"] = LimClass("Bool", lim_type, lim_type, stats=stats)
+        self.builtins["Function"] = LimClass("Function", lim_type, lim_type, stats=stats)
+        self.builtins["Method"] = LimClass("Method", self.builtins["Function"], lim_type, stats=stats)
+        self.builtins["Number"] = LimClass("Number", lim_type, lim_type, stats=stats)
+        self.builtins["Integer"] = LimClass("Integer", self.builtins["Number"], lim_type, stats=stats)
+        self.builtins["Float"] = LimClass("Float", self.builtins["Number"], lim_type, stats=stats)
+        self.builtins["String"] = LimClass("String", lim_type, lim_type, stats=stats)
+        self.builtins["Array"] = LimClass("Array", lim_type, lim_type, stats=stats)
+        self.builtins["Dictionary"] = LimClass("Dictionary", lim_type, lim_type, stats=stats)
 
         self.builtins["null"] = LimObj(self.builtins["Null"])
         self.build_prototypes()
@@ -118,6 +151,9 @@ class Scope:
     def build_native_function(self, fn):
         return self.builtins["Function"].instanciate(NativeCode(lambda *arg: self.program.build_lim_obj(fn(*arg))))
 
+    def build_async_native_function(self, fn):
+        return self.builtins["Function"].instanciate(NativeCode(lambda *arg: self.program.build_lim_obj(self.program.wait(fn(*arg)))))
+
     def array_to_string(self, array):
         elements = ', '.join([self.program.to_string(item).value for item in array.value])
         return f'[{elements}]'
@@ -176,38 +212,83 @@ class Scope:
                 builtin.prototype['$class'] = builtin
                 builtin.fields['$prototype'] = self.program.build_lim_obj({ self.program.build_lim_obj(key): value for key, value in self.program.build_lim_obj(builtin.prototype).value.items() })
 
+    def find(self, name, frame):
+        if name in self.builtins:
+            return self.builtins
+        if name in self.file_scope:
+            return self.file_scope
+        if frame is not None:
+            return frame.find(name)
+        return None
+
     def __getitem__(self, name):
-        for scope in [self.builtins, self.file_scope, *self.function_scopes]:
-            if name in scope:
-                return scope[name]
-        raise KeyError(f"Cannot find '{name}' in scope")
+        if self.program.stats.enabled:
+            self.program.stats.count('lookup')
+        scope = self.find(name, self.frame)
+        if scope is None:
+            raise KeyError(f"Cannot find '{name}' in scope")
+        return scope[name]
 
     def __setitem__(self, name, value):
-        for scope in [self.builtins, self.file_scope, *self.function_scopes]:
-            if name in scope:
-                scope[name] = value
-                break
-        else:
-            if self.function_scopes:
-                self.function_scopes[-1][name] = value
-            else:
-                self.file_scope[name] = value
+        if self.program.stats.enabled:
+            self.program.stats.count('lookup')
+        scope = self.find(name, self.frame)
+        if scope is None:
+            scope = self.frame.variables if self.frame is not None else self.file_scope
+        scope[name] = value
         return value
 
     def __contains__(self, name):
-        return name in self.builtins or name in self.file_scope or self.function_scopes and name in self.function_scopes[-1]
+        return name in self.builtins or name in self.file_scope or self.frame is not None and name in self.frame.variables
 
 class Program:
     def __init__(self):
+        self.stats = Stats()
         self.scope = Scope(self)
         self.scope.set_prototypes()
         self.scope.builtins["print"] = self.scope['Function'].instanciate(NativeCode(self.print))
+        self.scope.builtins["sleep"] = self.scope.build_async_native_function(lambda seconds: asyncio.sleep(seconds.value))
+        self.scope.builtins["read_file"] = self.scope.build_async_native_function(lambda path: asyncio.to_thread(read_file, os.path.join(self.directory, path.value)))
+        self.scope.builtins["$stats"] = self.scope.build_native_function(self.lim_stats)
+        self.directory = ''
+        self.task = None
+        self.loop = None
 
     def run(self, text):
         self.ast = parser.parse(text)
-        return self.stmt(self.ast)
+        try:
+            return self.stmt(self.ast)
+        finally:
+            if self.loop is not None:
+                self.loop.close()
+                self.loop = None
+
+    def wait(self, value):
+        if self.task is not None:
+            return self.task.wait(value)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            if inspect.iscoroutine(value):
+                value.close()
+            raise RuntimeError("Async natives cannot block a running event loop, run the program with host.Host")
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+        return self.loop.run_until_complete(value)
+
+    def lim_stats(self, *enabled):
+        if enabled:
+            if enabled[0].value:
+                self.stats.enable()
+            else:
+                self.stats.disable()
+        return self.stats.as_dict()
 
     def binop(self, lhs, rhs, op):
+        if self.stats.enabled:
+            self.stats.count('binop')
         return self.call(self.getfield(lhs, binops[op]), rhs)
 
     def build_lim_obj(self, obj):
@@ -241,9 +322,13 @@ class Program:
         return value
 
     def call(self, obj, *args):
+        if self.stats.enabled:
+            self.stats.count('call')
         return self.getfield(obj, '$call').value(obj, *args)
 
     def getfield(self, obj, field_name):
+        if self.stats.enabled:
+            self.stats.count('getfield')
         if field_name not in obj.fields:
             if field_name in obj.lim_class.fields['$prototype'].value:
                 field = obj.lim_class.fields['$prototype'].value[field_name]
@@ -310,7 +395,7 @@ class Program:
             return self.call(self.getfield(self.expr(ast[1]), '$setitem'), self.expr(ast[2]), self.expr(ast[3]))
         elif ast[0] == 'function_definition':
             function = self.scope['Function'].instanciate(LimCode(ast[2], self, self.build_array(ast[1])))
-            function.value.scopes = [*self.scope.function_scopes]
+            function.value.frame = self.scope.frame
             return function
         elif ast[0] == 'array_expression':
             return self.build_lim_obj(self.expr(ast[1]))
@@ -347,6 +432,8 @@ class Program:
         if ast[0] == 'program':
             return self.stmt(ast[1])
         elif ast[0] == 'statement_list':
+            if self.task is not None:
+                self.task.checkpoint()
             if len(ast) == 1:
                 return self.scope["Null"].instanciate(None)
             value = self.stmt(ast[1])
@@ -361,9 +448,18 @@ class Program:
 program = Program()
 
 if __name__ == '__main__':
-    with open(sys.argv[1], 'r') as f:
-        text = f.read()
+    arguments = argparse.ArgumentParser()
+    arguments.add_argument('path')
+    arguments.add_argument('--stats', metavar='PATH', help='dump allocation and operation counters as JSON to PATH at exit')
+    arguments.add_argument('--trace-memory', action='store_true', help='sample object sizes with tracemalloc')
+    args = arguments.parse_args()
+
+    if args.trace_memory and not args.stats:
+        arguments.error('--trace-memory requires --stats')
 
-    text = '\n'.join(clean_line for line in text.split("\n") if (clean_line := line.strip()))
+    if args.stats:
+        program.stats.enable(trace_memory=args.trace_memory)
+        atexit.register(program.stats.dump, args.stats)
 
-    program.run(text)
+    program.directory = os.path.dirname(args.path)
+    program.run(read_source(args.path))
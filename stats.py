@@ -0,0 +1,81 @@
+import copy
+import json
+import tracemalloc
+import weakref
+
+class ClassStats:
+    def __init__(self):
+        self.created = 0
+        self.freed = 0
+        self.samples = 0
+        self.sampled_bytes = 0
+
+    def free(self):
+        self.freed += 1
+
+    def sample(self, size):
+        self.samples += 1
+        self.sampled_bytes += size
+
+    def as_dict(self):
+        average = self.sampled_bytes / self.samples if self.samples else 0
+        return {
+            'created': self.created,
+            'live': self.created - self.freed,
+            'bytes': int(average * self.created),
+        }
+
+class Stats:
+    operations = ('getfield', 'call', 'binop', 'lookup', 'frame')
+
+    def __init__(self, sample_every=64):
+        self.enabled = False
+        self.trace_memory = False
+        self.started_tracing = False
+        self.sample_every = sample_every
+        self.reset()
+
+    def reset(self):
+        self.classes = {}
+        self.counts = {operation: 0 for operation in self.operations}
+
+    def enable(self, trace_memory=None):
+        self.enabled = True
+        if trace_memory is not None:
+            self.trace_memory = trace_memory
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+    def disable(self):
+        self.enabled = False
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def count(self, operation):
+        self.counts[operation] += 1
+
+    def instanciated(self, lim_class, obj):
+        counter = self.classes.get(lim_class.name)
+        if counter is None:
+            counter = self.classes[lim_class.name] = ClassStats()
+        if self.trace_memory and counter.created % self.sample_every == 0:
+            # obj is already allocated, measure the allocation of an identical copy
+            before = tracemalloc.get_traced_memory()[0]
+            sample = copy.copy(obj)
+            counter.sample(tracemalloc.get_traced_memory()[0] - before)
+            del sample
+        counter.created += 1
+        # Keep objects still alive at exit counted as live in the exit dump
+        weakref.finalize(obj, counter.free).atexit = False
+
+    def as_dict(self):
+        return {
+            'classes': {name: counter.as_dict() for name, counter in self.classes.items()},
+            'operations': dict(self.counts),
+        }
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2)
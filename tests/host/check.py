@@ -0,0 +1,62 @@
+import asyncio
+import contextlib
+import io
+import os
+import sys
+
+root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, root)
+
+from host import Host, spawn_file
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+def output(coroutine):
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        asyncio.run(coroutine)
+    return [line for line in stdout.getvalue().split('\n') if ':' in line]
+
+def counting(name, count=50):
+    items = ', '.join(str(i) for i in range(count))
+    return f"[{items}].$each((i) {{\nprint('{name}: ' + i)\n}})"
+
+async def sleeper_and_printer():
+    host = Host()
+    await asyncio.gather(
+        spawn_file(host, os.path.join(here, 'sleeper.lim')).run(),
+        spawn_file(host, os.path.join(here, 'printer.lim')).run(),
+    )
+
+async def cpu_bound(time_slice):
+    host = Host()
+    await asyncio.gather(
+        host.spawn(counting('x'), time_slice=time_slice).run(),
+        host.spawn(counting('y'), time_slice=time_slice).run(),
+    )
+
+def interleaved(lines):
+    first_y = next(i for i, line in enumerate(lines) if line.startswith('y'))
+    last_x = max(i for i, line in enumerate(lines) if line.startswith('x'))
+    return first_y < last_x
+
+lines = output(sleeper_and_printer())
+assert lines == [
+    'sleeper: going to sleep',
+    'printer: 1',
+    'printer: 2',
+    'printer: 3',
+    'sleeper: awake',
+], lines
+
+assert interleaved(output(cpu_bound(time_slice=0))), 'programs were not preempted by their time slice'
+assert not interleaved(output(cpu_bound(time_slice=60))), 'programs were preempted before their time slice was spent'
+
+try:
+    asyncio.run(Host().run("sleep('oops')"))
+except TypeError:
+    pass
+else:
+    raise AssertionError('errors raised in a program are not propagated')
+
+print('host ok')